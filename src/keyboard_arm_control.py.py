@@ -1,333 +1,587 @@
-import pyfirmata
-import time
-import threading
-import sys
-import msvcrt  # Built-in library for key presses on Windows
-
-# --- CONFIGURATION ---
-PORT = 'COM7' 
-
-# Define the digital pins on the Arduino
-SERVO_PINS = {
-    'base_1': 10,       # PWM
-    'base_2': 9,        # PWM
-    'shoulder': 11,     # PWM
-    'elbow': 6,         # PWM
-    'arm_bend': 5,      # PWM
-    'gripper_rotate': 3,  # PWM
-    'gripper_grasp': 4,   # NOT PWM on Uno - may be jerky
-}
-
-# Define the neutral (starting) angles for each servo (0-180 degrees)
-NEUTRAL_ANGLES = {
-    'base_1': 180,
-    'base_2': 0,
-    'shoulder': 180,
-    'elbow': 100,
-    'arm_bend': 75,
-    'gripper_rotate': 90,
-    'gripper_grasp': 80,   # Start with the gripper open
-}
-
-# --- CONTROL CONSTANTS ---
-INCREMENT = 5           # Degrees to move servo with each key press
-PLAYBACK_DELAY = 0.02   # Seconds between steps during playback
-RETURN_SPEED_DELAY = 0.02 # Seconds between steps during return-to-home
-
-# --- GLOBAL VARIABLES ---
-board = None
-servos = {}
-current_angles = NEUTRAL_ANGLES.copy()
-is_recording = False
-recorded_path = []
-stop_event = threading.Event() # For signaling threads to stop cleanly
-
-# --- CORE FUNCTIONS ---
-
-def setup_board():
-    """Establishes connection, configures servos, and moves to neutral position."""
-    global board, servos
-    print(f"Attempting to connect to Arduino on port {PORT}...")
-    try:
-        board = pyfirmata.Arduino(PORT)
-        time.sleep(2) # Allow time for the connection to establish
-        print("Connection successful!")
-
-        # Configure all servo pins
-        for name, pin in SERVO_PINS.items():
-            servos[name] = board.get_pin(f'd:{pin}:s')
-            print(f"  - Configured servo '{name}' on pin {pin}.")
-        
-        print("\nMoving servos to neutral positions...")
-        # Move all servos to their neutral positions one by one
-        for name, angle in NEUTRAL_ANGLES.items():
-            servos[name].write(angle)
-            time.sleep(0.15) # A small delay between servo initializations
-
-        print("Initial homing complete. Arm is in neutral position.")
-        print_instructions()
-        return True
-    except Exception as e:
-        print(f"ERROR: Could not connect to Arduino on {PORT}.")
-        print("Please check the port and make sure StandardFirmataPlus is uploaded.")
-        print(f"Error details: {e}")
-        return False
-
-def move_servo(name, angle):
-    """Moves a specified servo to a given angle, respecting limits (0-180)."""
-    # Clamp the angle to the valid range of 0-180 degrees
-    angle = max(0, min(180, angle))
-    if name in servos:
-        current_angles[name] = angle
-        servos[name].write(angle)
-    else:
-        print(f"\nWARNING: Servo '{name}' not found.")
-
-def record_current_state():
-    """If recording is active, appends the current state of all servos to the path."""
-    if is_recording:
-        recorded_path.append(current_angles.copy())
-        # NOTE: We removed the print statement from here to prevent console spam.
-        # The 'print_status' function will show the point count.
-
-def return_to_neutral_slowly():
-    """Slowly moves all servos back to their defined neutral positions."""
-    if is_recording:
-        print("\nCannot return to home while recording.")
-        return
-
-    print("\nReturning to neutral position slowly...")
-    temp_angles = current_angles.copy()
-
-    # Continue until all servos have reached their neutral angle
-    while any(int(temp_angles[name]) != NEUTRAL_ANGLES[name] for name in SERVO_PINS):
-        if stop_event.is_set(): # Check for exit signal
-            print("Return to neutral interrupted.")
-            break
-
-        for name in SERVO_PINS.keys():
-            current = temp_angles[name]
-            neutral = NEUTRAL_ANGLES[name]
-
-            if int(current) != neutral:
-                # Move one step closer to the neutral angle
-                if current < neutral:
-                    new_angle = current + 1
-                else:
-                    new_angle = current - 1
-                move_servo(name, new_angle)
-                temp_angles[name] = new_angle
-        
-        time.sleep(RETURN_SPEED_DELAY)
-    
-    if not stop_event.is_set():
-        print("Arm has returned to neutral position.")
-    print_status() # Update the status line
-
-def playback_path():
-    """Plays back the recorded path of servo movements one time."""
-    if not recorded_path:
-        print("\nNothing recorded to play back.")
-        return
-
-    print("\n--- Starting Playback ---")
-    for i, angles_state in enumerate(recorded_path):
-        if stop_event.is_set(): # Check for exit signal
-            print("Playback interrupted.")
-            break
-
-        for name, angle in angles_state.items():
-            servos[name].write(angle)
-            current_angles[name] = angle
-        time.sleep(PLAYBACK_DELAY)
-
-    print("--- Playback Finished ---")
-    print_status() # Update the status line
-
-def print_instructions():
-    """Prints the control instructions to the console."""
-    print("\n--- Robotic Arm Controls ---")
-    print("Press a key to control the arm. (No 'Enter' needed)")
-    print("\n--- Movement ---")
-    print(f"Base:           <Left Arrow> / <Right Arrow> (Moves by {INCREMENT}°)")
-    print(f"Shoulder:       <Up Arrow> / <Down Arrow>   (Moves by {INCREMENT}°)")
-    print(f"Elbow:          'w' / 's'                   (Moves by {INCREMENT}°)")
-    print(f"Arm Bend:       't' / 'y'                   (Moves by {INCREMENT}°)")
-    print(f"Gripper Rotate: 'a' / 'd'                   (Moves by {INCREMENT}°)")
-    print(f"Gripper Grasp:  '1' (Close) / '2' (Open)  (Moves by {INCREMENT}°)")
-    print("\n--- System ---")
-    print("Start Record:   'r'")
-    print("Stop Record:    'o'")
-    print("Playback Path:  'p'")
-    print("Return to Home: 'h'")
-    print("Show Help:      '?' (Question Mark)")
-    print("Exit Program:   <Esc> (Escape Key)")
-    print("----------------------------")
-
-def print_status():
-    """Prints the current servo angles and recording status on one line."""
-    # Format all angles to 3 characters to prevent line "jiggling"
-    b1 = f"{current_angles['base_1']:3}"
-    b2 = f"{current_angles['base_2']:3}"
-    sh = f"{current_angles['shoulder']:3}"
-    el = f"{current_angles['elbow']:3}"
-    ab = f"{current_angles['arm_bend']:3}"
-    gr = f"{current_angles['gripper_rotate']:3}"
-    gg = f"{current_angles['gripper_grasp']:3}"
-
-    angle_str = (
-        f"Base: {b1}/{b2} | Shoulder: {sh} | Elbow: {el} | "
-        f"Arm Bend: {ab} | Rotate: {gr} | Grasp: {gg}"
-    )
-    
-    rec_str = ""
-    if is_recording:
-        rec_str = f" | REC: ON | Points: {len(recorded_path)}"
-    
-    # Write the status line, using \r to return to the start of the line
-    # Pad with spaces to overwrite any previous, longer text
-    status_line = f"\r{angle_str}{rec_str}"
-    sys.stdout.write(status_line + " " * (79 - len(status_line)))
-    sys.stdout.flush()
-
-def process_command(command):
-    """Parses and executes the user's command."""
-    global is_recording
-    
-    # --- Movement Controls ---
-    if command == 'left':
-        move_servo('base_1', current_angles['base_1'] + INCREMENT)
-        move_servo('base_2', current_angles['base_2'] - INCREMENT)
-    elif command == 'right':
-        move_servo('base_1', current_angles['base_1'] - INCREMENT)
-        move_servo('base_2', current_angles['base_2'] + INCREMENT)
-        
-    elif command == 'down':
-        move_servo('shoulder', current_angles['shoulder'] + INCREMENT)
-    elif command == 'up':
-        move_servo('shoulder', current_angles['shoulder'] - INCREMENT)
-
-    elif command == 'w':
-        move_servo('elbow', current_angles['elbow'] + INCREMENT)
-    elif command == 's':
-        move_servo('elbow', current_angles['elbow'] - INCREMENT)
-        
-    elif command == 't':
-        move_servo('arm_bend', current_angles['arm_bend'] + INCREMENT)
-    elif command == 'y':
-        move_servo('arm_bend', current_angles['arm_bend'] - INCREMENT)
-        
-    elif command == 'a':
-        move_servo('gripper_rotate', current_angles['gripper_rotate'] + INCREMENT)
-    elif command == 'd':
-        move_servo('gripper_rotate', current_angles['gripper_rotate'] - INCREMENT)
-
-    elif command == '1':
-        move_servo('gripper_grasp', current_angles['gripper_grasp'] + INCREMENT) # Close
-    elif command == '2':
-        move_servo('gripper_grasp', current_angles['gripper_grasp'] - INCREMENT) # Open
-    
-    # --- System Controls ---
-    elif command == 'r':
-        if not is_recording:
-            is_recording = True
-            recorded_path.clear()
-            print("\nREC: Recording started. Press 'o' to stop.")
-        else:
-            print("\nAlready recording.")
-    
-    elif command == 'p':
-        if is_recording:
-            print("\nStop recording ('o') before playing back.")
-        else:
-            # Run playback in a thread so it doesn't block key presses
-            playback_thread = threading.Thread(target=playback_path, daemon=True)
-            playback_thread.start()
-    
-    elif command == 'o':
-        if is_recording:
-            is_recording = False
-            print(f"\nREC: Recording stopped. {len(recorded_path)} points saved.")
-        else:
-            print("\nNot currently recording.")
-
-    elif command == 'h':
-        # Run 'home' in a thread so it doesn't block key presses
-        home_thread = threading.Thread(target=return_to_neutral_slowly, daemon=True)
-        home_thread.start()
-    
-    elif command == 'help':
-        print_instructions()
-
-    else:
-        # Don't do anything for unmapped keys
-        return # Don't record an unknown command
-
-    # If the command was a movement command, record the state
-    if command not in ['r', 'p', 'o', 'h', 'help']:
-        record_current_state()
-
-# --- MAIN EXECUTION ---
-
-def main_loop():
-    """Main loop to listen for single-key presses using msvcrt."""
-    print_status() # Show the initial status
-    while not stop_event.is_set():
-        try:
-            # Check if a key has been pressed
-            if msvcrt.kbhit():
-                key = msvcrt.getch()
-
-                # --- Handle Special Keys (Arrows, Esc) ---
-                if key == b'\xe0': # Special key prefix
-                    try:
-                        key2 = msvcrt.getch() # Read the second part
-                        if key2 == b'H':
-                            process_command('up')
-                        elif key2 == b'P':
-                            process_command('down')
-                        elif key2 == b'K':
-                            process_command('left')
-                        elif key2 == b'M':
-                            process_command('right')
-                    except:
-                        pass # Ignore errors in special key reading
-                    
-                # --- Escape key (b'\x1b') ---
-                elif key == b'\x1b':
-                    print("\n'Esc' key pressed. Shutting down...")
-                    stop_event.set()
-                    break
-                
-                # --- Handle Normal Keys (Letters/Numbers) ---
-                else:
-                    try:
-                        char = key.decode('utf-8')
-                        if char == '?':
-                            process_command('help')
-                        elif char in ['w', 's', 't', 'y', 'a', 'd', '1', '2', 'r', 'o', 'p', 'h']:
-                            process_command(char)
-                    except UnicodeDecodeError:
-                        pass # Ignore keys we can't decode
-
-                # Update the status line after every command
-                print_status()
-
-            # Prevent the loop from using 100% CPU
-            time.sleep(0.01)
-
-        except KeyboardInterrupt:
-            print("\nProgram interrupted (Ctrl+C). Shutting down.")
-            stop_event.set()
-            break
-
-if __name__ == "__main__":
-    if setup_board():
-        try:
-            main_loop() # Call the new main loop
-        finally:
-            stop_event.set() # Signal all threads to stop
-            print("\nExiting Arduino connection.")
-            if board:
-                board.exit()
+import pyfirmata
+import ctypes
+import time
+import threading
+import queue
+import struct
+import sys
+import msvcrt  # Built-in library for key presses on Windows
+from array import array
+from functools import partial
+
+import numpy as np
+
+# --- CONFIGURATION ---
+PORT = 'COM7'
+
+# Servo layout as parallel tuples, indexed by the constants below.
+# Flat arrays keep the angle state in 7 raw bytes instead of a string-keyed
+# dict, so snapshots and copies are C-level memcpy instead of dict builds.
+SERVO_NAMES = (
+    'base_1',
+    'base_2',
+    'shoulder',
+    'elbow',
+    'arm_bend',
+    'gripper_rotate',
+    'gripper_grasp',
+)
+
+# Digital pins on the Arduino (all PWM except pin 4 - may be jerky on Uno)
+SERVO_PIN_NUMS = (10, 9, 11, 6, 5, 3, 4)
+
+# Integer indices into the angle arrays, one per servo
+BASE1, BASE2, SHOULDER, ELBOW, ARM_BEND, GRIPPER_ROTATE, GRIPPER_GRASP = range(7)
+NUM_SERVOS = len(SERVO_NAMES)
+
+# Neutral (starting) angles for each servo (0-180 degrees, gripper open)
+NEUTRAL_ANGLES = array('B', [180, 0, 180, 100, 75, 90, 80])
+
+# --- CONTROL CONSTANTS ---
+INCREMENT = 5           # Degrees to move servo with each key press
+PLAYBACK_DELAY = 0.02   # Seconds between steps during playback
+RETURN_SPEED_DELAY = 0.02 # Seconds between steps during return-to-home
+
+# --- GLOBAL VARIABLES ---
+board = None
+servos = [] # pyfirmata pin objects, indexed like SERVO_NAMES
+current_angles = array('B', NEUTRAL_ANGLES)
+is_recording = False
+# Recordings are stored as (ticks, servo index, angle) delta events - one
+# event per servo that actually changed, with the delay since the previous
+# event in PLAYBACK_DELAY ticks. Unchanged axes cost nothing.
+EVENT_FMT = '<HBB'
+EVENT_BYTES = struct.calcsize(EVENT_FMT)
+recorded_path = bytearray() # Flat EVENT_BYTES-sized delta events
+_last_recorded = bytearray(NEUTRAL_ANGLES) # Angles as of the last event
+_last_record_time = 0.0
+_record_start = bytearray(NEUTRAL_ANGLES) # Arm pose when recording began
+# Compiled at record stop: (ticks, serial message, resulting angles) per
+# keypress, so playback sends prebuilt bytes with zero encoding work.
+_playback_script = []
+stop_event = threading.Event() # For signaling threads to stop cleanly
+_pending = {} # Servo updates (pin -> angle) waiting to be flushed in one write
+_pending_lock = threading.Lock() # Guards _pending and the _tpl templates
+_tpl = {} # Preallocated Firmata message template per pin (built at setup)
+cmd_q = queue.Queue() # Commands decoded by the keyboard reader thread
+_job_q = queue.Queue(maxsize=4) # Long-running jobs for the worker thread
+
+# --- CORE FUNCTIONS ---
+
+def setup_board():
+    """Establishes connection, configures servos, and moves to neutral position."""
+    global board, servos
+    print(f"Attempting to connect to Arduino on port {PORT}...")
+    try:
+        board = pyfirmata.Arduino(PORT)
+        time.sleep(0.8) # Covers the Uno's DTR-reset bootloader delay
+        print("Connection successful!")
+
+        # Tighten the serial timeouts: the pyserial defaults can block a
+        # read indefinitely, and a stalled write would hang the control
+        # thread. Also ask the driver for low-latency mode - FTDI/CDC
+        # adapters default to a 16 ms latency timer that dominates the
+        # round-trip time of every 3-byte servo command.
+        board.sp.timeout = 0.05
+        board.sp.write_timeout = 0.1
+        try:
+            board.sp.set_low_latency_mode(True)
+        except (AttributeError, ValueError, OSError):
+            pass # Needs pyserial >= 3.5 and a driver that supports it
+
+        # Configure all servo pins
+        for name, pin in zip(SERVO_NAMES, SERVO_PIN_NUMS):
+            servos.append(board.get_pin(f'd:{pin}:s'))
+            print(f"  - Configured servo '{name}' on pin {pin}.")
+        build_templates()
+
+        print("\nMoving servos to neutral positions...")
+        # The servos move in parallel hardware, so send every neutral angle
+        # in one serial write and wait once for the worst-case travel time,
+        # rather than 150 ms per servo in sequence.
+        for idx, angle in enumerate(NEUTRAL_ANGLES):
+            move_servo(idx, angle)
+        flush_pending()
+        time.sleep(0.4)
+
+        print("Initial homing complete. Arm is in neutral position.")
+        print_instructions()
+        return True
+    except Exception as e:
+        print(f"ERROR: Could not connect to Arduino on {PORT}.")
+        print("Please check the port and make sure StandardFirmataPlus is uploaded.")
+        print(f"Error details: {e}")
+        return False
+
+# Clamp lookup table covering angles -256..255, indexed at angle + 256.
+# A single bytes subscript replaces the max()/min() call pair on every move.
+_CLAMP = bytes(min(max(i - 256, 0), 180) for i in range(512))
+
+def move_servo(idx, angle):
+    """Queues a move of the servo at index idx to a given angle, respecting limits (0-180)."""
+    # Clamp the angle to the valid range of 0-180 degrees
+    angle = _CLAMP[angle + 256]
+    current_angles[idx] = angle
+    with _pending_lock:
+        _pending[SERVO_PIN_NUMS[idx]] = angle
+
+def build_templates():
+    """Preallocates one Firmata message buffer per servo pin.
+
+    The command prefix of an ANALOG_MESSAGE (0xE0 | pin) never changes for
+    a given pin - only the two angle data bytes do. Keeping a reusable
+    bytearray per pin means flushing just patches two bytes in place
+    instead of allocating fresh message buffers on every keypress.
+    """
+    for pin in SERVO_PIN_NUMS:
+        if pin < 16:
+            _tpl[pin] = bytearray([0xE0 | pin, 0, 0])
+        else:
+            # Pins above 15 need the EXTENDED_ANALOG SysEx form
+            _tpl[pin] = bytearray([0xF0, 0x6F, pin, 0, 0, 0xF7])
+
+def flush_pending():
+    """Sends all queued servo updates to the board in a single serial write.
+
+    Each per-pin write through pyfirmata costs a separate serial syscall,
+    so two-axis moves (e.g. 'left'/'right') pay that cost twice. Instead we
+    patch the angle bytes into each pending pin's preallocated template
+    and push the joined buffer to the serial port at once.
+
+    Both the main thread and the job worker flush, so the lock covers the
+    whole encode-and-write: a keypress landing mid-flush would otherwise
+    mutate _pending (or a template) while it is being iterated, and the
+    lock also keeps the two threads' port writes from interleaving.
+    """
+    if not _pending or board is None:
+        return
+    with _pending_lock:
+        if not _pending: # Another thread flushed while we waited
+            return
+        for pin, angle in _pending.items():
+            tpl = _tpl[pin]
+            off = 1 if len(tpl) == 3 else 3 # Data bytes follow the SysEx header
+            tpl[off] = angle & 0x7F
+            tpl[off + 1] = (angle >> 7) & 0x7F
+        buf = b''.join(_tpl[pin] for pin in _pending)
+        _pending.clear()
+        board.sp.write(buf)
+
+def record_current_state():
+    """If recording is active, appends delta events for the servos that moved.
+
+    Only servos whose angle changed since the last event are stored, and
+    the first event of a keypress carries the real elapsed time, so
+    playback follows the operator's timing instead of a fixed grid.
+    """
+    global _last_record_time
+    if not is_recording:
+        return
+    now = time.monotonic()
+    ticks = min(int((now - _last_record_time) / PLAYBACK_DELAY), 0xFFFF)
+    recorded = False
+    for idx in range(NUM_SERVOS):
+        angle = current_angles[idx]
+        if angle != _last_recorded[idx]:
+            recorded_path.extend(struct.pack(EVENT_FMT, ticks, idx, angle))
+            _last_recorded[idx] = angle
+            ticks = 0 # Later events of the same keypress are simultaneous
+            recorded = True
+    if recorded:
+        _last_record_time = now
+    # NOTE: We removed the print statement from here to prevent console spam.
+    # The 'print_status' function will show the point count.
+
+def return_to_neutral_slowly():
+    """Slowly moves all servos back to their defined neutral positions."""
+    if is_recording:
+        print("\nCannot return to home while recording.")
+        return
+
+    print("\nReturning to neutral position slowly...")
+    cur = np.array(current_angles, dtype=np.int16)
+    target = np.array(NEUTRAL_ANGLES, dtype=np.int16)
+
+    # Local aliases: each name below is hit on every tick, and LOAD_FAST
+    # on a local is much cheaper than the dict lookup behind LOAD_GLOBAL.
+    angles = current_angles
+    move = move_servo
+    flush = flush_pending
+    stopping = stop_event.is_set
+    sleep = time.sleep
+
+    # Continue until all servos have reached their neutral angle
+    while not np.array_equal(cur, target):
+        if stopping(): # Check for exit signal
+            print("Return to neutral interrupted.")
+            break
+
+        # Step every servo toward neutral in one vector op. The step size
+        # scales with the remaining distance (1-10 degrees per tick): the
+        # servos slew far faster than 1 degree / 20 ms anyway, so small
+        # fixed steps just waste ticks and serial bytes on long swings.
+        delta = target - cur
+        step = np.sign(delta) * np.minimum(np.maximum(np.abs(delta) // 20, 1), 10)
+        cur += step.astype(np.int16)
+        for idx in range(NUM_SERVOS):
+            angle = int(cur[idx])
+            if angle != angles[idx]:
+                move(idx, angle)
+
+        flush() # One serial write per step, not one per servo
+        sleep(RETURN_SPEED_DELAY)
+    
+    if not stop_event.is_set():
+        print("Arm has returned to neutral position.")
+    print_status() # Update the status line
+
+def append_servo_message(msg, pin, angle):
+    """Appends the Firmata message commanding one servo angle to msg."""
+    if pin < 16:
+        msg.extend((0xE0 | pin, angle & 0x7F, (angle >> 7) & 0x7F))
+    else:
+        msg.extend((0xF0, 0x6F, pin, angle & 0x7F, (angle >> 7) & 0x7F, 0xF7))
+
+def compile_playback():
+    """Pre-encodes the finished recording into ready-to-send segments.
+
+    Walks the delta events once, at record stop, coalescing simultaneous
+    events (zero delay - they came from the same keypress) into one serial
+    message. Each segment is (ticks, message bytes, resulting angles), so
+    playback does no Firmata encoding at all - it just sleeps and writes.
+    """
+    global _playback_script
+    if not recorded_path:
+        _playback_script = []
+        return
+
+    script = []
+    angles = array('B', _record_start)
+
+    # First command the full starting pose on all pins: the delta events
+    # only cover servos that moved during the recording, and a servo the
+    # operator never touched must still be driven back to where it was
+    # when recording began, or playback from any other pose leaves the
+    # software state out of sync with the physical arm.
+    msg = bytearray()
+    for idx in range(NUM_SERVOS):
+        append_servo_message(msg, SERVO_PIN_NUMS[idx], angles[idx])
+    script.append((0, bytes(msg), array('B', angles)))
+
+    i = 0
+    end = len(recorded_path)
+    while i < end:
+        ticks, idx, angle = struct.unpack_from(EVENT_FMT, recorded_path, i)
+        i += EVENT_BYTES
+        msg = bytearray()
+        while True:
+            angles[idx] = angle
+            append_servo_message(msg, SERVO_PIN_NUMS[idx], angle)
+            if i >= end:
+                break
+            next_ticks, idx, angle = struct.unpack_from(EVENT_FMT, recorded_path, i)
+            if next_ticks:
+                break
+            i += EVENT_BYTES
+        script.append((ticks, bytes(msg), array('B', angles)))
+    _playback_script = script
+
+def playback_path():
+    """Plays back the recorded path of servo movements one time."""
+    if not _playback_script:
+        print("\nNothing recorded to play back.")
+        return
+
+    print("\n--- Starting Playback ---")
+    # Local aliases: LOAD_FAST on a local beats the dict lookup behind
+    # LOAD_GLOBAL, and everything here runs once per recorded keypress.
+    write = board.sp.write
+    stopping = stop_event.is_set
+    sleep = time.sleep
+
+    for ticks, msg, angles in _playback_script:
+        if stopping(): # Check for exit signal
+            print("Playback interrupted.")
+            break
+
+        if ticks:
+            sleep(ticks * PLAYBACK_DELAY)
+        write(msg) # Prebuilt bytes - zero encoding during playback
+        current_angles[:] = angles
+
+    print("--- Playback Finished ---")
+    print_status() # Update the status line
+
+def set_control_scheduling(whole_process=False):
+    """Pins the calling thread to core 0 at above-normal priority.
+
+    Any scheduling delay between queueing a servo update and the serial
+    write shows up as a visible stutter on the arm, so the threads that
+    write to the port are kept on one core at raised priority instead of
+    being bounced between cores by the scheduler. Best effort only -
+    if the calls fail we just run at default scheduling.
+    """
+    try:
+        kernel32 = ctypes.windll.kernel32
+        if whole_process:
+            kernel32.SetPriorityClass(
+                kernel32.GetCurrentProcess(), 0x00000080) # HIGH_PRIORITY_CLASS
+        thread = kernel32.GetCurrentThread()
+        kernel32.SetThreadAffinityMask(thread, 1) # Core 0 only
+        kernel32.SetThreadPriority(thread, 1) # THREAD_PRIORITY_ABOVE_NORMAL
+    except (AttributeError, OSError):
+        pass
+
+def drain_serial_input():
+    """Discards unsolicited Firmata input so the OS buffer can't fill up.
+
+    This script deliberately never starts pyfirmata's util.Iterator: it
+    reads no sensor data, and the iterator's polling thread would only
+    contend for the GIL with the control path and add write-side jitter.
+    The firmware still sends the odd unsolicited report (version,
+    capability), so those bytes are thrown away from the idle loop.
+    """
+    try:
+        n = board.sp.in_waiting
+        if n:
+            board.sp.read(n)
+    except OSError:
+        pass # Port went away mid-read; shutdown will notice
+
+def job_worker():
+    """Runs long-lived arm jobs ('home', 'playback') one at a time.
+
+    A single persistent consumer replaces the thread spawned per 'h'/'p'
+    keypress: no per-keypress thread setup cost, and homing and playback
+    can never run concurrently and interleave writes on the serial port.
+    """
+    set_control_scheduling() # This thread also writes to the serial port
+    jobs = {'home': return_to_neutral_slowly, 'playback': playback_path}
+    while not stop_event.is_set():
+        try:
+            job = _job_q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        try:
+            jobs[job]()
+        except Exception as e:
+            # A failed job (e.g. a serial write timeout while homing) must
+            # not kill the only worker - that would silently disable 'h'
+            # and 'p' for the rest of the session. Report it and move on.
+            print(f"\nERROR: '{job}' job failed: {e}")
+
+def print_instructions():
+    """Prints the control instructions to the console."""
+    print("\n--- Robotic Arm Controls ---")
+    print("Press a key to control the arm. (No 'Enter' needed)")
+    print("\n--- Movement ---")
+    print(f"Base:           <Left Arrow> / <Right Arrow> (Moves by {INCREMENT}°)")
+    print(f"Shoulder:       <Up Arrow> / <Down Arrow>   (Moves by {INCREMENT}°)")
+    print(f"Elbow:          'w' / 's'                   (Moves by {INCREMENT}°)")
+    print(f"Arm Bend:       't' / 'y'                   (Moves by {INCREMENT}°)")
+    print(f"Gripper Rotate: 'a' / 'd'                   (Moves by {INCREMENT}°)")
+    print(f"Gripper Grasp:  '1' (Close) / '2' (Open)  (Moves by {INCREMENT}°)")
+    print("\n--- System ---")
+    print("Start Record:   'r'")
+    print("Stop Record:    'o'")
+    print("Playback Path:  'p'")
+    print("Return to Home: 'h'")
+    print("Show Help:      '?' (Question Mark)")
+    print("Exit Program:   <Esc> (Escape Key)")
+    print("----------------------------")
+
+# Status-line template, precompiled so each redraw is a single %-format
+# call instead of seven f-string allocations plus concatenation.
+# The \r returns to the start of the line; angles are fixed at 3 characters
+# to prevent line "jiggling".
+_STATUS_FMT = ("\rBase: %3d/%3d | Shoulder: %3d | Elbow: %3d | "
+               "Arm Bend: %3d | Rotate: %3d | Grasp: %3d")
+_STATUS_PAD = " " * 28 # Wide enough to clear a previous REC/Points suffix
+_last_status = None # Snapshot of what the status line last showed
+
+def print_status():
+    """Prints the current servo angles and recording status on one line."""
+    global _last_status
+
+    # Console writes plus flush are surprisingly expensive (hundreds of
+    # microseconds on the Windows console) - skip the redraw entirely if
+    # nothing the line shows has changed, e.g. a key held at its clamp.
+    snapshot = (bytes(current_angles), is_recording, len(recorded_path))
+    if snapshot == _last_status:
+        return
+    _last_status = snapshot
+
+    line = _STATUS_FMT % tuple(current_angles)
+    if is_recording:
+        line += " | REC: ON | Points: %d" % (len(recorded_path) // EVENT_BYTES)
+    else:
+        line += _STATUS_PAD # Overwrite any previous, longer text
+    sys.stdout.write(line)
+    sys.stdout.flush()
+
+def nudge_servo(idx, direction):
+    """Moves one servo by INCREMENT degrees in the given direction (+1/-1)."""
+    move_servo(idx, current_angles[idx] + direction * INCREMENT)
+
+def nudge_base(direction):
+    """Rotates the base by driving its two opposed servos in opposite directions."""
+    move_servo(BASE1, current_angles[BASE1] + direction * INCREMENT)
+    move_servo(BASE2, current_angles[BASE2] - direction * INCREMENT)
+
+def start_recording():
+    """Begins recording the arm's movements ('r')."""
+    global is_recording, _last_record_time
+    if not is_recording:
+        is_recording = True
+        recorded_path.clear()
+        _last_recorded[:] = current_angles # Buffer-to-buffer copy, no temporary
+        _record_start[:] = current_angles
+        _last_record_time = time.monotonic()
+        print("\nREC: Recording started. Press 'o' to stop.")
+    else:
+        print("\nAlready recording.")
+
+def stop_recording():
+    """Stops an active recording ('o')."""
+    global is_recording
+    if is_recording:
+        is_recording = False
+        compile_playback() # Encode the serial byte stream once, up front
+        print(f"\nREC: Recording stopped. {len(recorded_path) // EVENT_BYTES} points saved.")
+    else:
+        print("\nNot currently recording.")
+
+def request_playback():
+    """Hands playback to the worker so it doesn't block key presses ('p')."""
+    if is_recording:
+        print("\nStop recording ('o') before playing back.")
+    else:
+        try:
+            _job_q.put_nowait('playback')
+        except queue.Full:
+            pass # Job queue is saturated; drop the repeat request
+
+def request_home():
+    """Hands 'home' to the worker so it doesn't block key presses ('h')."""
+    try:
+        _job_q.put_nowait('home')
+    except queue.Full:
+        pass # Job queue is saturated; drop the repeat request
+
+# Command dispatch table: one O(1) dict lookup per keypress instead of
+# walking a 20-branch if/elif chain. Movement commands are the ones whose
+# result should be recorded when recording is active.
+MOVEMENT_CMDS = frozenset(
+    ('left', 'right', 'up', 'down', 'w', 's', 't', 'y', 'a', 'd', '1', '2'))
+
+DISPATCH = {
+    'left': partial(nudge_base, +1),
+    'right': partial(nudge_base, -1),
+    'down': partial(nudge_servo, SHOULDER, +1),
+    'up': partial(nudge_servo, SHOULDER, -1),
+    'w': partial(nudge_servo, ELBOW, +1),
+    's': partial(nudge_servo, ELBOW, -1),
+    't': partial(nudge_servo, ARM_BEND, +1),
+    'y': partial(nudge_servo, ARM_BEND, -1),
+    'a': partial(nudge_servo, GRIPPER_ROTATE, +1),
+    'd': partial(nudge_servo, GRIPPER_ROTATE, -1),
+    '1': partial(nudge_servo, GRIPPER_GRASP, +1), # Close
+    '2': partial(nudge_servo, GRIPPER_GRASP, -1), # Open
+    'r': start_recording,
+    'o': stop_recording,
+    'p': request_playback,
+    'h': request_home,
+    'help': print_instructions,
+}
+
+def process_command(command):
+    """Parses and executes the user's command."""
+    handler = DISPATCH.get(command)
+    if handler is None:
+        return # Don't do anything for unmapped keys
+
+    handler()
+
+    # If the command was a movement command, record the state
+    if command in MOVEMENT_CMDS:
+        record_current_state()
+
+# --- MAIN EXECUTION ---
+
+# Key decode tables: the second character of an arrow-key escape sequence
+# and the plain keys, each resolved to a command in one dict lookup.
+_ARROW_KEYS = {'H': 'up', 'P': 'down', 'K': 'left', 'M': 'right'}
+_NORMAL_KEYS = {c: c for c in ('w', 's', 't', 'y', 'a', 'd', '1', '2', 'r', 'o', 'p', 'h')}
+_NORMAL_KEYS['?'] = 'help'
+
+def keyboard_reader():
+    """Blocks on key presses and pushes decoded commands onto the queue.
+
+    Runs in a daemon thread so the blocking msvcrt.getwch() call never
+    stalls the rest of the program. Blocking beats the old kbhit() poll:
+    no wasted wakeups, and no polling-interval lag on each keypress.
+    """
+    while not stop_event.is_set():
+        ch = msvcrt.getwch()
+
+        # --- Escape key ('\x1b') ---
+        if ch == '\x1b':
+            print("\n'Esc' key pressed. Shutting down...")
+            stop_event.set()
+            break
+
+        # --- Arrow keys arrive as a two-character escape sequence ---
+        if ch in ('\x00', '\xe0'): # Special key prefix
+            command = _ARROW_KEYS.get(msvcrt.getwch())
+        else:
+            command = _NORMAL_KEYS.get(ch)
+
+        if command:
+            cmd_q.put(command)
+
+def main_loop():
+    """Main loop dispatching commands from the keyboard reader thread."""
+    set_control_scheduling(whole_process=True)
+    print_status() # Show the initial status
+    reader_thread = threading.Thread(target=keyboard_reader, daemon=True)
+    reader_thread.start()
+    worker_thread = threading.Thread(target=job_worker, daemon=True)
+    worker_thread.start()
+
+    while not stop_event.is_set():
+        try:
+            command = cmd_q.get(timeout=0.1)
+        except queue.Empty:
+            # Idle (runs at most every 0.1 s): discard any unsolicited
+            # Firmata input, then re-check the stop event.
+            drain_serial_input()
+            continue
+        except KeyboardInterrupt:
+            print("\nProgram interrupted (Ctrl+C). Shutting down.")
+            stop_event.set()
+            break
+
+        # Drain any burst of queued commands (key auto-repeat can produce
+        # ~30 per second) and process them as one batch: repeated moves
+        # merge in the pending dict and go out in a single serial write,
+        # with a single status redraw, instead of one of each per key.
+        while True:
+            process_command(command)
+            try:
+                command = cmd_q.get_nowait()
+            except queue.Empty:
+                break
+
+        flush_pending()
+        print_status() # Update the status line after every batch
+
+if __name__ == "__main__":
+    if setup_board():
+        try:
+            main_loop() # Call the new main loop
+        finally:
+            stop_event.set() # Signal all threads to stop
+            print("\nExiting Arduino connection.")
+            if board:
+                board.exit()
             print("Shutdown complete.")
\ No newline at end of file